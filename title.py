@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
 
+import itertools
+import mmap
 import os
 import re
 import string
 import subprocess
 import sys
 import shutil
+import unicodedata
 import unidecode
 import argparse
 import logging
 
 
 from argparse import FileType
+from concurrent.futures import ProcessPoolExecutor
 
 from pdfminer.pdfdocument import PDFDocument
 from pdfminer.pdfpage import PDFPage
@@ -20,23 +24,65 @@ from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.converter import PDFPageAggregator
 from pdfminer.layout import LAParams, LTChar, LTFigure, LTTextBox, LTTextLine
 
+try:
+    import playa
+    from playa.pdftypes import resolve1
+except ImportError:
+    playa = None
+
 logger = logging.getLogger(__name__)
 
 __all__ = ['pdf_title']
 
 
-def make_parsing_state(*sequential, **named):
-    enums = dict(zip(sequential, range(len(sequential))), **named)
-    return type('ParsingState', (), enums)
-
-
-CHAR_PARSING_STATE = make_parsing_state('INIT_X', 'INIT_D', 'INSIDE_WORD')
+# Char parsing states of `_figure_actions`
+INIT_X, INIT_D, INSIDE_WORD = 0, 1, 2
+# What `extract_figure_text` does with each char
+CHAR_APPEND, CHAR_SPACE, CHAR_NEW_LINE = 0, 1, 2
 MIN_CHARS = 6
 MAX_WORDS = 20
 MAX_CHARS = MAX_WORDS * 10
 TOLERANCE = 1e-06
+# Absolute tolerance for two font sizes to count as the same. Looser than
+# a relative `TOLERANCE` (~1e-5 at 10pt), but still well under the 0.01pt
+# steps font sizes usually come in
+SIZE_TOLERANCE = 1e-04
+# How many title font sizes below the title we keep scanning
+TITLE_DEPTH = 4
+# Largest text is only trusted to be the title from this font size on
+MIN_TITLE_SIZE = 14
+# Text fragments closer than this many font sizes share a baseline
+BASELINE_TOLERANCE = 0.2
+# A gap wider than this many font sizes between glyphs is a space
+SPACE_GAP = 0.1
+# Fragments further apart than this many font sizes are separate lines
+CHAR_MARGIN = 2.0
+# A vertical gap wider than this many line heights separates blocks
+BLOCK_GAP = 0.7
+# So does a line height change by more than this fraction
+BLOCK_SIZE_CHANGE = 0.2
+# Importing numba and loading the compiled `_figure_actions` takes about
+# half a second, which pure Python spends on a couple million chars
+JIT_MIN_CHARS = 2000000
 IS_LOG_ON = False
 
+_RE_COMMA = re.compile(r',')
+_RE_COLON = re.compile(r': ')
+_RE_PDFEXT = re.compile(r'\.pdf(\.pdf)*$')
+_RE_CID = re.compile(r'(\(cid:[0-9 \t-]*\))*')
+_RE_PLACEHOLDER = re.compile(
+    r'^[0-9 \t-]+(abstract|introduction)?\s+$|^(abstract|unknown|title|untitled):?$')
+_RE_COPYRIGHT = re.compile(
+    r'paper\s+title|technical\s+report|proceedings|preprint|to\s+appear|submission|(integrated|international).*conference|transactions\s+on|symposium\s+on|downloaded\s+from\s+http')
+_RE_NLTAIL = re.compile(r'\n$')
+
+_NON_ASCII_LETTERS = bytes(
+    c for c in range(128) if chr(c) not in string.ascii_letters)
+_DROP_WS = str.maketrans('', '', ' \t\n')
+_FINAL_STRIP = str.maketrans('', '', '.\t\n')
+VALID_CHARS = "-_.() %s%s" % (string.ascii_letters, string.digits)
+_INVALID_CHARS = bytes(c for c in range(128) if chr(c) not in VALID_CHARS)
+
 
 def sanitize(filename):
     """Turn string into a valid file name.
@@ -49,29 +95,54 @@ def sanitize(filename):
         filename = filename[0:MAX_CHARS]
 
     # Preserve letters with diacritics
-    try:
-        filename = unidecode.unidecode(
-            filename.encode('utf-8').decode('utf-8'))
-    except UnicodeDecodeError:
-        logger.info(
-            "*** Skipping invalid title decoding for file %s! ***" % filename)
+    filename = unidecode.unidecode(unicodedata.normalize('NFKC', filename))
 
     # Preserve subtitle and itemization separators
-    filename = re.sub(r',', ' ', filename)
-    filename = re.sub(r': ', ' - ', filename)
+    filename = _RE_COMMA.sub(' ', filename)
+    filename = _RE_COLON.sub(' - ', filename)
 
     # Strip repetitions
-    filename = re.sub(r'\.pdf(\.pdf)*$', '', filename)
-    filename = re.sub(r'[ \t][ \t]*', ' ', filename)
+    filename = _RE_PDFEXT.sub('', filename)
+    filename = ' '.join(filename.split())
 
-    valid_chars = "-_.() %s%s" % (string.ascii_letters, string.digits)
-    return ''.join([c for c in filename if c in valid_chars])
+    # Drop anything outside `VALID_CHARS`; non-ASCII is already gone
+    # after `unidecode`, so the rest can be filtered on bytes.
+    return filename.encode('ascii', 'ignore').translate(
+        None, _INVALID_CHARS).decode('ascii')
 
 
-def meta_title(filename):
+def _open_doc(filename):
+    """Open and parse a PDF once, so every strategy can share it.
+    This is a playa document when playa is available; otherwise a
+    pdfminer document over a memory map of the file, since the parser
+    seeks around a lot to resolve object references.
+    Returns the object to close and the document.
+    """
+    if playa is not None:
+        doc = playa.open(filename, space='page')
+        return (doc, doc)
+
+    with open(filename, 'rb') as f:
+        fp = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        parser = PDFParser(fp)
+        doc = PDFDocument(parser, '')
+        parser.set_document(doc)
+    except Exception:
+        fp.close()
+        raise
+    return (fp, doc)
+
+
+def meta_title(doc):
     """Title from pdf metadata.
     """
-    docinfo = PDFDocument(PDFParser(open(filename, 'rb'))).info
+    if playa is not None and isinstance(doc, playa.Document):
+        # playa only reads the trailer, keep pdfminer's list of dicts
+        info = resolve1(doc.trailer.get('Info'))
+        docinfo = [info] if info else None
+    else:
+        docinfo = doc.info
     if docinfo is None:
         return ''
     for meta in docinfo:
@@ -87,34 +158,36 @@ def meta_title(filename):
 def junk_line(line):
     """Judge if a line is not appropriate for a title.
     """
-    too_small = len(line.strip()) < MIN_CHARS
-    is_placeholder_text = bool(re.search(
-        r'^[0-9 \t-]+(abstract|introduction)?\s+$|^(abstract|unknown|title|untitled):?$', line.strip().lower()))
-    is_copyright_info = bool(re.search(
-        r'paper\s+title|technical\s+report|proceedings|preprint|to\s+appear|submission|(integrated|international).*conference|transactions\s+on|symposium\s+on|downloaded\s+from\s+http', line.lower()))
+    stripped = line.strip()
+    if len(stripped) < MIN_CHARS:
+        return True
 
-    # NOTE: Titles which only contain a number will be discarded
-    stripped_to_ascii = ''.join(
-        [c for c in line.strip() if c in string.ascii_letters])
-    ascii_length = len(stripped_to_ascii)
-    stripped_to_chars = re.sub(r'[ \t\n]', '', line.strip())
-    chars_length = len(stripped_to_chars)
-    is_serial_number = ascii_length < chars_length / 2
+    lowered = stripped.lower()
+    if _RE_PLACEHOLDER.search(lowered) or _RE_COPYRIGHT.search(lowered):
+        return True
 
-    return too_small or is_placeholder_text or is_copyright_info or is_serial_number
+    # NOTE: Titles which only contain a number will be discarded
+    ascii_length = len(stripped.encode('ascii', 'ignore').translate(
+        None, _NON_ASCII_LETTERS))
+    chars_length = len(stripped.translate(_DROP_WS))
+    return ascii_length < chars_length / 2
 
 
 def empty_str(s):
     return len(s.strip()) == 0
 
 
+def nonws_length(s):
+    return len(s) - s.count(' ') - s.count('\t') - s.count('\n')
+
+
 def is_close(a, b, relative_tolerance=TOLERANCE):
     return abs(a-b) <= relative_tolerance * max(abs(a), abs(b))
 
 
 def update_largest_text(line, y0, size, largest_text):
-    logger.debug('update size: ' + str(size))
-    logger.debug('largest_text size: ' + str(largest_text['size']))
+    logger.debug('update size: %s', size)
+    logger.debug('largest_text size: %s', largest_text['size'])
 
     # Sometimes font size is not correctly read, so we
     # fallback to text y0 (not even height may be calculated).
@@ -123,37 +196,43 @@ def update_largest_text(line, y0, size, largest_text):
         return largest_text
 
     # If it is a split line, it may contain a new line at the end
-    line = re.sub(r'\n$', ' ', line)
+    line = _RE_NLTAIL.sub(' ', line)
 
-    if (size - largest_text['size'] > TOLERANCE):
+    if (size - largest_text['size'] >= SIZE_TOLERANCE):
         largest_text = {
-            'contents': line,
+            'contents': [line],
             'y0': y0,
             'size': size
         }
     # Title spans multiple lines
-    elif is_close(size, largest_text['size']):
-        largest_text['contents'] = largest_text['contents'] + line
+    elif abs(size - largest_text['size']) < SIZE_TOLERANCE:
+        largest_text['contents'].append(line)
         largest_text['y0'] = y0
 
     return largest_text
 
 
+def _contents_str(largest_text):
+    """Join the lines collected by `update_largest_text`.
+    """
+    return ''.join(largest_text['contents'])
+
+
 def extract_largest_text(obj, largest_text):
     # Skip first letter of line when calculating size, as articles
     # may enlarge it enough to be bigger then the title size.
     # Also skip other elements such as `LTAnno`.
     for i, child in enumerate(obj):
         if isinstance(child, LTTextLine):
-            logger.debug('lt_obj child line: ' + str(child))
+            logger.debug('lt_obj child line: %s', child)
             for j, child2 in enumerate(child):
-                if j > 1 and isinstance(child2, LTChar):
+                if j > 1 and type(child2) is LTChar:
                     largest_text = update_largest_text(
                         child.get_text(), child2.y0, child2.size, largest_text)
                     # Only need to parse size of one char
                     break
-        elif i > 1 and isinstance(child, LTChar):
-            logger.debug('lt_obj child char: ' + str(child))
+        elif i > 1 and type(child) is LTChar:
+            logger.debug('lt_obj child char: %s', child)
             largest_text = update_largest_text(
                 obj.get_text(), child.y0, child.size, largest_text)
             # Only need to parse size of one char
@@ -161,195 +240,389 @@ def extract_largest_text(obj, largest_text):
     return largest_text
 
 
+def _figure_actions(x0, x1, size, actions):
+    """
+    Detect line breaks and missing spaces from char geometry alone,
+    storing one `CHAR_*` action per char into `actions`.
+    Compiled with numba for large figures, see `_figure_kernel`.
+    """
+    line_size = 0.0
+    char_distance = 0.0
+    char_previous_x1 = 0.0
+    state = INIT_X
+    for k in range(len(x0)):
+        (char_x0, char_x1, char_size) = (x0[k], x1[k], size[k])
+        # A new line was detected
+        if char_size != line_size:
+            actions[k] = CHAR_NEW_LINE
+            line_size = char_size
+            char_previous_x1 = char_x1
+            state = INIT_D
+            continue
+
+        # Spaces may not be present as `LTChar` elements,
+        # so we manually add them.
+        # NOTE: A word starting with lowercase can't be
+        # distinguished from the current word.
+        actions[k] = CHAR_APPEND
+        char_current_distance = abs(char_x0 - char_previous_x1)
+
+        # Initialization
+        if state == INIT_X:
+            char_previous_x1 = char_x1
+            state = INIT_D
+        elif state == INIT_D:
+            # Update distance only if no space is detected
+            if (char_distance > 0) and (char_current_distance < char_distance * 2.5):
+                char_distance = char_current_distance
+            if (char_distance < 0.1):
+                char_distance = 0.1
+            state = INSIDE_WORD
+        # If the x-position decreased, then it's a new line
+        if (state == INSIDE_WORD) and (char_x1 < char_previous_x1):
+            actions[k] = CHAR_SPACE
+            char_previous_x1 = char_x1
+            state = INIT_D
+        # Large enough distance: it's a space
+        elif (state == INSIDE_WORD) and (char_current_distance > char_distance * 8.5):
+            actions[k] = CHAR_SPACE
+            char_previous_x1 = char_x1
+        # When larger distance is detected between chars, use it to
+        # improve our heuristic
+        elif (state == INSIDE_WORD) and (char_current_distance > char_distance) and (char_current_distance < char_distance * 2.5):
+            char_distance = char_current_distance
+            char_previous_x1 = char_x1
+        # Chars are sequential
+        else:
+            char_previous_x1 = char_x1
+
+
+_jit_figure_actions = None
+
+
+def _figure_kernel():
+    """Compile `_figure_actions` with numba on first use.
+    Returns None when numba is not available.
+    """
+    global _jit_figure_actions
+    if _jit_figure_actions is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _jit_figure_actions = False
+        else:
+            _jit_figure_actions = njit(cache=True)(_figure_actions)
+    return _jit_figure_actions or None
+
+
 def extract_figure_text(lt_obj, largest_text):
     """
     Extract text contained in a `LTFigure`.
     Since text is encoded in `LTChar` elements, we detect separate lines
     by keeping track of changes in font size.
     """
-    text = ''
-    line = ''
-    y0 = 0
-    size = 0
-    char_distance = 0
-    char_previous_x1 = 0
-    state = CHAR_PARSING_STATE.INIT_X
+    # Ignore other elements
+    chars = []
+    x0 = []
+    x1 = []
+    sizes = []
     for child in lt_obj:
-        logger.debug('child: ' + str(child))
-
-        # Ignore other elements
-        if not isinstance(child, LTChar):
-            continue
+        if type(child) is LTChar:
+            chars.append(child)
+            x0.append(child.x0)
+            x1.append(child.x1)
+            sizes.append(child.size)
+    kernel = _figure_kernel() if len(chars) >= JIT_MIN_CHARS else None
+    if kernel is not None:
+        # Always installed along with numba
+        import numpy as np
+        actions = np.empty(len(chars), np.int8)
+        kernel(np.array(x0), np.array(x1), np.array(sizes), actions)
+        actions = actions.tolist()
+    else:
+        actions = [CHAR_APPEND] * len(chars)
+        _figure_actions(x0, x1, sizes, actions)
 
-        char_y0 = child.y0
-        char_size = child.size
+    text = []
+    line = []
+    y0 = 0
+    size = 0
+    for (child, char_size, action) in zip(chars, sizes, actions):
         char_text = child.get_text()
-        decoded_char_text = unidecode.unidecode(
-            char_text.encode('utf-8').decode('utf-8'))
-        logger.debug('char: ' + str(char_size) + ' ' + str(decoded_char_text))
+        logger.debug('char: %s %s', char_size, char_text)
 
-        # A new line was detected
-        if char_size != size:
+        if action == CHAR_NEW_LINE:
             logger.debug('new line')
+            line = ''.join(line)
             largest_text = update_largest_text(line, y0, size, largest_text)
-            text += line + '\n'
-            line = char_text
-            y0 = char_y0
+            text.append(line + '\n')
+            line = [char_text]
+            y0 = child.y0
             size = char_size
+            continue
 
-            char_previous_x1 = child.x1
-            state = CHAR_PARSING_STATE.INIT_D
-        else:
-            # Spaces may not be present as `LTChar` elements,
-            # so we manually add them.
-            # NOTE: A word starting with lowercase can't be
-            # distinguished from the current word.
-            char_current_distance = abs(child.x0 - char_previous_x1)
-            logger.debug('char_current_distance: ' +
-                         str(char_current_distance))
-            logger.debug('char_distance: ' + str(char_distance))
-            logger.debug('state: ' + str(state))
-
-            # Initialization
-            if state == CHAR_PARSING_STATE.INIT_X:
-                char_previous_x1 = child.x1
-                state = CHAR_PARSING_STATE.INIT_D
-            elif state == CHAR_PARSING_STATE.INIT_D:
-                # Update distance only if no space is detected
-                if (char_distance > 0) and (char_current_distance < char_distance * 2.5):
-                    char_distance = char_current_distance
-                if (char_distance < 0.1):
-                    char_distance = 0.1
-                state = CHAR_PARSING_STATE.INSIDE_WORD
-            # If the x-position decreased, then it's a new line
-            if (state == CHAR_PARSING_STATE.INSIDE_WORD) and (child.x1 < char_previous_x1):
-                logger.debug('x-position decreased')
-                line += ' '
-                char_previous_x1 = child.x1
-                state = CHAR_PARSING_STATE.INIT_D
-            # Large enough distance: it's a space
-            elif (state == CHAR_PARSING_STATE.INSIDE_WORD) and (char_current_distance > char_distance * 8.5):
-                logger.debug('space detected')
-                logger.debug('char_current_distance: ' +
-                             str(char_current_distance))
-                logger.debug('char_distance: ' + str(char_distance))
-                line += ' '
-                char_previous_x1 = child.x1
-            # When larger distance is detected between chars, use it to
-            # improve our heuristic
-            elif (state == CHAR_PARSING_STATE.INSIDE_WORD) and (char_current_distance > char_distance) and (char_current_distance < char_distance * 2.5):
-                char_distance = char_current_distance
-                char_previous_x1 = child.x1
-            # Chars are sequential
-            else:
-                char_previous_x1 = child.x1
-            child_text = child.get_text()
-            if not empty_str(child_text):
-                line += child_text
-    return (largest_text, text)
-
-
-def pdf_text(filename):
-    fp = open(filename, 'rb')
-    parser = PDFParser(fp)
-    doc = PDFDocument(parser, '')
-    parser.set_document(doc)
-    rsrcmgr = PDFResourceManager()
-    laparams = LAParams()
+        if action == CHAR_SPACE:
+            logger.debug('space detected')
+            line.append(' ')
+        if char_text.strip():
+            line.append(char_text)
+    return (largest_text, ''.join(text))
+
+
+def pdf_text(doc):
+    # Fonts are cached by object id, which is only unique within one
+    # document, so the manager can't be shared across files. CMaps are
+    # already cached process-wide by pdfminer's `CMapDB`.
+    rsrcmgr = PDFResourceManager(caching=True)
+    # Skip the hierarchical text box clustering (`boxes_flow`), which is
+    # the slow part of layout analysis and is not needed to spot a title.
+    # Boxes then come sorted top-down, which the early stop below relies on.
+    laparams = LAParams(boxes_flow=None)
     device = PDFPageAggregator(rsrcmgr, laparams=laparams)
     interpreter = PDFPageInterpreter(rsrcmgr, device)
 
-    text = ''
+    text = []
     largest_text = {
-        'contents': '',
+        'contents': [],
         'y0': 0,
         'size': 0
     }
-    for page in PDFPage.create_pages(doc):
+    below_title = False
+    # Only parse the first page; `create_pages` walks the page tree lazily
+    for page in itertools.islice(PDFPage.create_pages(doc), 1):
         interpreter.process_page(page)
         layout = device.get_result()
         for lt_obj in layout:
-            logger.debug('lt_obj: ' + str(lt_obj))
-            if isinstance(lt_obj, LTFigure):
+            logger.debug('lt_obj: %s', lt_obj)
+            # `LTTextBox` and `LTTextLine` are abstract, so only
+            # concrete types can be matched exactly
+            if type(lt_obj) is LTFigure:
                 (largest_text, figure_text) = extract_figure_text(
                     lt_obj, largest_text)
-                text += figure_text
+                text.append(figure_text)
             elif isinstance(lt_obj, (LTTextBox, LTTextLine)):
+                # Text boxes come top-down, before any figure. Once we are
+                # well below a credible title, body text has begun, so skip
+                # the remaining boxes but still look at the figures.
+                if below_title or (largest_text['size'] >= MIN_TITLE_SIZE
+                                   and not empty_str(_contents_str(largest_text))
+                                   and lt_obj.y1 < largest_text['y0'] - TITLE_DEPTH * largest_text['size']):
+                    logger.debug('below title, skip text box')
+                    below_title = True
+                    continue
+
+                obj_text = lt_obj.get_text()
                 # Ignore body text blocks
-                stripped_to_chars = re.sub(
-                    r'[ \t\n]', '', lt_obj.get_text().strip())
-                if (len(stripped_to_chars) > MAX_CHARS * 2):
+                if (len(obj_text) > MAX_CHARS * 2 and nonws_length(obj_text) > MAX_CHARS * 2):
                     continue
 
                 largest_text = extract_largest_text(lt_obj, largest_text)
-                text += lt_obj.get_text() + '\n'
+                text.append(obj_text + '\n')
 
-        # Remove unprocessed CID text
-        largest_text['contents'] = re.sub(
-            r'(\(cid:[0-9 \t-]*\))*', '', largest_text['contents'])
+        return _finish_text(largest_text, text)
 
-        # Only parse the first page
-        return (largest_text, text)
 
+def _playa_lines(page):
+    """
+    Group the glyphs of a playa page into lines.
+    Each text object is a single text-show operator, so fragments on the
+    same baseline and close enough to each other are joined, and spaces
+    are inserted where the gap between two glyphs is wide enough.
+    Yields `(line, y0, size, glyphs)`.
+    """
+    line = []
+    glyphs = 0
+    (baseline, y0, size) = (None, 0, 0)
+    (previous_x1, previous_size) = (0, 0)
+    for obj in page.texts:
+        obj_size = obj.size
+        obj_baseline = obj.origin[1]
+        # Fonts may change within a line, e.g. for enlarged first letters
+        # or Latin next to CJK text, so only the position of a fragment
+        # decides where the line ends
+        margin = max(obj_size, previous_size)
+        same_line = (baseline is not None
+                     and abs(obj_baseline - baseline) <= BASELINE_TOLERANCE * margin
+                     and abs(obj.bbox[0] - previous_x1) < CHAR_MARGIN * margin)
+        if not same_line:
+            if line:
+                yield (''.join(line), y0, size, glyphs)
+            line = []
+            glyphs = 0
+            (baseline, y0, size) = (obj_baseline, 0, 0)
+            previous_x1 = obj.bbox[0]
+        previous_size = obj_size
+
+        for glyph in obj:
+            char_text = glyph.text
+            if not char_text:
+                continue
+            (x0, glyph_y0, x1, _) = glyph.bbox
+            # Spaces may not be present as glyphs, so we manually add them
+            if (line and x0 - previous_x1 > SPACE_GAP * obj_size
+                    and not line[-1].isspace() and not char_text.isspace()):
+                line.append(' ')
+            line.append(char_text)
+            # Like `extract_largest_text`, skip the first letters of the
+            # line when calculating size, as articles may enlarge them
+            if glyphs == 2:
+                (y0, size) = (glyph_y0, glyph.size)
+            glyphs += 1
+            previous_x1 = x1
+    if line:
+        yield (''.join(line), y0, size, glyphs)
+
+
+def playa_text(doc):
+    """
+    Same as `pdf_text`, using playa's lazy interpreter, which only
+    decodes the text objects of the first page, including figures.
+    """
+    text = []
+    largest_text = {
+        'contents': [],
+        'y0': 0,
+        'size': 0
+    }
+    for (line, y0, size, glyphs) in _playa_lines(doc.pages[0]):
+        logger.debug('line: %s %s', size, line)
+        # Ignore body text blocks
+        if (len(line) > MAX_CHARS * 2 and nonws_length(line) > MAX_CHARS * 2):
+            continue
+
+        # Like `extract_largest_text`, only lines longer than their
+        # first letters count towards the title size
+        if glyphs > 2:
+            largest_text = update_largest_text(
+                line + '\n', y0, size, largest_text)
+        text.append(line + '\n')
 
-def title_start(lines):
-    for i, line in enumerate(lines):
-        if not empty_str(line) and not junk_line(line):
-            return i
-    return 0
+    return _finish_text(largest_text, text)
 
 
-def title_end(lines, start, max_lines=2):
-    for i, line in enumerate(lines[start+1:start+max_lines+1], start+1):
+def _finish_text(largest_text, text):
+    # Remove unprocessed CID text, and fold ligatures and other
+    # compatibility characters once for the whole page
+    largest_text['contents'] = unicodedata.normalize(
+        'NFKC', _RE_CID.sub('', _contents_str(largest_text)))
+
+    return (largest_text, unicodedata.normalize('NFKC', ''.join(text)))
+
+
+def title_range(lines, max_lines=2):
+    """Find the first title-like line, and where a title starting
+    there ends, in a single pass over `lines`.
+    """
+    numbered = enumerate(lines)
+    start = next((i for (i, line) in numbered
+                  if not empty_str(line) and not junk_line(line)), None)
+    if start is None:
+        start = 0
+        numbered = enumerate(itertools.islice(lines, 1, None), 1)
+
+    for (i, line) in itertools.islice(numbered, max_lines):
         if empty_str(line):
-            return i
-    return start + 1
+            return (start, i)
+    return (start, start + 1)
 
 
-def text_title(filename):
+def text_title(doc):
     """Extract title from PDF's text.
     """
-    (largest_text, lines_joined) = pdf_text(filename)
+    return _largest_text_title(*pdf_text(doc))
+
 
+def playa_title(doc):
+    """Extract title from PDF's text, using playa.
+    """
+    return _largest_text_title(*playa_text(doc))
+
+
+def _largest_text_title(largest_text, lines_joined):
     if empty_str(largest_text['contents']):
         lines = lines_joined.strip().split('\n')
-        i = title_start(lines)
-        j = title_end(lines, i)
+        (i, j) = title_range(lines)
         text = ' '.join(line.strip() for line in lines[i:j])
     else:
         text = largest_text['contents'].strip()
 
-    # Strip dots, which conflict with os.path's splittext()
-    text = re.sub(r'\.', '', text)
+    # Strip dots, which conflict with os.path's splittext(),
+    # and extra whitespace
+    return text.translate(_FINAL_STRIP)
+
 
-    # Strip extra whitespace
-    text = re.sub(r'[\t\n]', '', text)
+def pdfium_lines(textpage):
+    """
+    Split the text of a pdfium text page into lines, with an empty line
+    between blocks as `pdftotext` does, since `get_text_range` has none.
+    """
+    lines = []
+    previous = None
+    index = 0
+    for line in textpage.get_text_range().split('\r\n'):
+        # pdfium indexes chars in UTF-16 code units
+        units = len(line.encode('utf-16-le')) // 2
+        if units == 0:
+            index += 2
+            continue
+        # Skip first letters, as articles may enlarge them
+        (_, bottom, _, top) = textpage.get_charbox(
+            index + min(2, units - 1), loose=True)
+        index += units + 2
+        if previous is not None:
+            (previous_bottom, previous_top) = previous
+            height = previous_top - previous_bottom
+            # A wide vertical gap or a change of font size ends a block
+            if (previous_bottom - top > BLOCK_GAP * height
+                    or abs((top - bottom) - height) > BLOCK_SIZE_CHANGE * height):
+                lines.append('')
+        lines.append(line)
+        previous = (bottom, top)
+    return lines
+
+
+def first_page_text(filename):
+    """Plain text of the first page, using pdfium in-process if available,
+    otherwise `pdftotext`.
+    """
+    # Only imported here, as this is the last strategy `pdf_title` tries
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        pdfium = None
+
+    if pdfium is not None:
+        try:
+            pdf = pdfium.PdfDocument(filename)
+        except pdfium.PdfiumError:
+            logger.info("*** Skipping invalid pdfium parsing for file %s! ***" % filename)
+            return ''
+        try:
+            return '\n'.join(pdfium_lines(pdf[0].get_textpage()))
+        finally:
+            pdf.close()
 
-    return text
+    try:
+        process = subprocess.run(['pdftotext', '-f', '1', '-l', '1', filename, '-'],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+    except OSError:
+        logger.info("*** pdftotext is not available! ***")
+        return ''
+    return process.stdout.decode('utf-8', 'replace')
 
 
 def pdftotext_title(filename):
-    """Extract title using `pdftotext`
+    """Extract title using pdfium or `pdftotext`
     """
-    command = 'pdftotext {} -'.format(re.sub(' ', '\\ ', filename))
-    process = subprocess.Popen([command],
-                               shell=True,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-    out, err = process.communicate()
-    lines = out.strip().split('\n')
-
-    i = title_start(lines)
-    j = title_end(lines, i)
-    text = ' '.join(line.strip() for line in lines[i:j])
-
-    # Strip dots, which conflict with os.path's splittext()
-    text = re.sub(r'\.', '', text)
+    lines = first_page_text(filename).strip().splitlines()
 
-    # Strip extra whitespace
-    text = re.sub(r'[\t\n]', '', text)
+    (i, j) = title_range(lines)
+    text = ' '.join(line.strip() for line in lines[i:j])
 
-    return text
+    # Strip dots, which conflict with os.path's splittext(),
+    # and extra whitespace
+    return text.translate(_FINAL_STRIP)
 
 
 def valid_title(title):
@@ -360,18 +633,31 @@ def pdf_title(filename):
     """Extract title using one of multiple strategies.
     """
     try:
-        title = meta_title(filename)
-        if valid_title(title):
-            return title
-    except Exception as e:
-        logger.info("*** Skipping invalid metadata for file %s! ***" % filename)
-
-    try:
-        title = text_title(filename)
-        if valid_title(title):
-            return title
+        (fp, doc) = _open_doc(filename)
     except Exception as e:
-        logger.info("*** Skipping invalid parsing for file %s! ***" % filename)
+        logger.info("*** Skipping invalid document for file %s! ***" % filename)
+        (fp, doc) = (None, None)
+
+    if doc is not None:
+        with fp:
+            try:
+                title = meta_title(doc)
+                if valid_title(title):
+                    return title
+            except Exception as e:
+                logger.info(
+                    "*** Skipping invalid metadata for file %s! ***" % filename)
+
+            try:
+                if playa is not None:
+                    title = playa_title(doc)
+                else:
+                    title = text_title(doc)
+                if valid_title(title):
+                    return title
+            except Exception as e:
+                logger.info(
+                    "*** Skipping invalid parsing for file %s! ***" % filename)
 
     title = pdftotext_title(filename)
     if valid_title(title):
@@ -380,6 +666,40 @@ def pdf_title(filename):
     return os.path.basename(os.path.splitext(filename)[0])
 
 
+def _process_one(filename, args):
+    """Extract and sanitize the title of one file, in a worker process.
+    """
+    title = pdf_title(filename)
+    title = sanitize(' '.join(title.split()))
+    if args.underscore:
+        title = title.replace(" ", "_")
+    return title
+
+
+def place_file(src, dst, move=False):
+    """Put `src` at `dst`, hard-linking or moving instead of copying
+    its contents whenever both are on the same filesystem.
+    """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            # Already linked; a move just drops the old name
+            if move and os.path.abspath(src) != os.path.abspath(dst):
+                os.remove(src)
+            return
+        os.remove(dst)
+
+    if move:
+        # `os.rename` when possible, copy and delete across filesystems
+        shutil.move(src, dst)
+        return
+
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Cross-device, or hard links are not supported
+        shutil.copy(src, dst)
+
+
 def DirPath(string):
     if os.path.isdir(string):
         return string
@@ -387,51 +707,94 @@ def DirPath(string):
         raise NotADirectoryError(string)
 
 
-parser = argparse.ArgumentParser(description='Extract title from PDF file.')
-parser.add_argument('--dist', dest="dist", type=DirPath, default='.')
-parser.add_argument('--override', dest='override', action='store_true')
-parser.add_argument('--rename', dest='rename', action='store_true')
-parser.add_argument('--dry-run', dest="dryRun", action='store_true')
-parser.add_argument('--underscore', dest="underscore", action='store_true')
-parser.add_argument('-v', '--verbose', dest="verbose", action='store_true')
-parser.add_argument('-vvv', '--debug', dest="debug", action='store_true')
-parser.add_argument('filenames', nargs="+")
+def PositiveInt(string):
+    value = int(string)
+    if value <= 0:
+        raise argparse.ArgumentTypeError('%s is not a positive integer' % string)
+    return value
 
-fh = logging.StreamHandler(sys.stdout)
-formatter = logging.Formatter(
-    '[%(levelname)8s]: %(message)s')
-fh.setFormatter(formatter)
 
-if __name__ == "__main__":
-    args = parser.parse_args()
-    if args.verbose:
+def init_logging(verbose, debug):
+    """Log to stdout at the level given on the command line.
+    Also the pool initializer, as workers don't run `main()` when
+    they are spawned rather than forked.
+    """
+    # Forked workers inherit the handler
+    if logger.handlers:
+        return
+
+    fh = logging.StreamHandler(sys.stdout)
+    formatter = logging.Formatter(
+        '[%(levelname)8s]: %(message)s')
+    fh.setFormatter(formatter)
+
+    if verbose:
         # logging.basicConfig(level=logging.INFO)
         fh.setLevel(logging.INFO)
         logger.setLevel(logging.INFO)
-    if args.debug:
+    if debug:
         fh.setLevel(logging.DEBUG)
         logger.setLevel(logging.DEBUG)
 
     logger.addHandler(fh)
 
-    for filename in args.filenames:
-        title = pdf_title(filename)
-        title = sanitize(' '.join(title.split()))
-        if args.underscore:
-            title = title.replace(" ", "_")
 
+def main():
+    parser = argparse.ArgumentParser(description='Extract title from PDF file.')
+    parser.add_argument('--dist', dest="dist", type=DirPath, default='.')
+    parser.add_argument('--override', dest='override', action='store_true')
+    parser.add_argument('--rename', dest='rename', action='store_true')
+    parser.add_argument('--move', dest='move', action='store_true')
+    parser.add_argument('--dry-run', dest="dryRun", action='store_true')
+    parser.add_argument('--underscore', dest="underscore", action='store_true')
+    parser.add_argument('-j', '--jobs', dest="jobs", type=PositiveInt, default=None)
+    parser.add_argument('-v', '--verbose', dest="verbose", action='store_true')
+    parser.add_argument('-vvv', '--debug', dest="debug", action='store_true')
+    parser.add_argument('filenames', nargs="+")
+
+    args = parser.parse_args()
+    if args.move and not args.rename:
+        parser.error('--move requires --rename')
+    init_logging(args.verbose, args.debug)
+
+    # Titles are extracted in parallel, but renaming happens here in
+    # order, so existing targets are detected without races
+    if len(args.filenames) == 1 or args.jobs == 1:
+        titles = (_process_one(filename, args) for filename in args.filenames)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=args.jobs,
+                                       initializer=init_logging,
+                                       initargs=(args.verbose, args.debug))
+        titles = executor.map(_process_one, args.filenames,
+                              itertools.repeat(args))
+
+    # Targets placed by this run; with `--move` they may be the only
+    # copy of an input, so they are never overridden
+    placed = set()
+    for filename, title in zip(args.filenames, titles):
         if args.rename:
             new_name = os.path.join(args.dist, title + ".pdf")
             logger.warning("Rename: %s => %s" % (filename, new_name))
             if not args.dryRun:
                 if os.path.exists(new_name):
-                    if not args.override:
+                    if not args.override or os.path.realpath(new_name) in placed:
                         logger.error("Target %s already exists! " % new_name)
+                        if executor is not None:
+                            executor.shutdown(cancel_futures=True)
                         sys.exit(-1)
                     else:
                         logger.warning("Override %s" % new_name)
-                        shutil.copy(filename, new_name)
+                        place_file(filename, new_name, args.move)
                 else:
-                    shutil.copy(filename, new_name)
+                    place_file(filename, new_name, args.move)
+                placed.add(os.path.realpath(new_name))
         else:
             sys.stdout.write(title)
+
+    if executor is not None:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()